@@ -23,74 +23,106 @@
 import os
 
 from .models import *
+from .pragmas import SQLITE_PRAGMAS, SQLITE_BUILD_PRAGMAS, set_sqlite_pragmas
 
 def nodot(item):
   """Can be used to ignore hidden files, starting with the . character."""
   return item[0] != '.'
 
+def insert_rows(session, model, rows):
+  """Inserts the given rows into the table of the given model, bypassing the ORM."""
+  if rows:
+    session.connection().execute(model.__table__.insert(), rows)
+
 def add_files(session, basedir, verbose):
   """Adds files to the LFW database.
-     Returns dictionaries with ids of the clients and ids of the files
-     in the generated SQL tables"""
+     All clients and files are collected first and then inserted in bulk."""
+
+  client_rows = []
+  file_rows = []
 
-  def add_client(session, client_id):
+  def add_client(client_id):
     """Adds a client to the LFW database."""
-    c = Client(client_dir)
-    session.add(c)
-    return c.id
+    client_rows.append({'id': client_id})
+    return client_id
 
-  def add_file(session, file_name):
+  def add_file(file_name):
     """Parses a single filename and add it to the list."""
     base_name = os.path.splitext(os.path.basename(file_name))[0]
     shot_id = base_name.split('_')[-1]
     client_id = base_name[0:-len(shot_id)-1]
-    f = File(client_id, shot_id)
-    session.add(f)
+    fn = filename(client_id, shot_id)
+    file_rows.append({'name': fn, 'client_id': client_id, 'path': os.path.join(client_id, fn), 'shot_id': int(shot_id)})
 
   # Loops over the directory structure
   if verbose: print("Adding clients and files ...")
   imagedir = os.path.join(basedir, 'all_images')
-  for client_dir in filter(nodot, sorted([d for d in os.listdir(imagedir)])):
+  # collect the images of all clients in a single directory walk
+  clients = {}
+  for root, dirs, files in os.walk(imagedir, followlinks=True):
+    if root == imagedir:
+      # only descend into the (non-hidden) client directories
+      dirs[:] = filter(nodot, dirs)
+      continue
+    dirs[:] = []
+    clients[os.path.basename(root)] = [f for f in files if nodot(f) and f.endswith('.jpg')]
+
+  for client_dir in sorted(clients):
     # adds a client to the database
-    client_name = add_client(session, client_dir)
+    client_name = add_client(client_dir)
     if verbose>1: print("  Adding client '%s'" % client_name)
-    for filename in filter(nodot, sorted([d for d in os.listdir(os.path.join(imagedir, client_dir))])):
-      if filename.endswith('.jpg'):
-        # adds a file to the database
-        if verbose>1: print("    Adding file '%s'" % filename)
-        add_file(session, filename)
+    for image_name in sorted(clients[client_dir]):
+      # adds a file to the database
+      if verbose>1: print("    Adding file '%s'" % image_name)
+      add_file(image_name)
+
+  # bulk insert, without creating any objects in the session
+  insert_rows(session, Client, client_rows)
+  insert_rows(session, File, file_rows)
+
+
+def file_ids(session):
+  """Returns a dictionary from file name to file id for all files in the LFW database."""
+  return dict(session.query(File.name, File.id))
 
 
 def add_people(session, basedir, verbose):
   """Adds the people to the LFW database"""
 
-  def add_client(session, protocol, client_id, count):
+  ids = file_ids(session)
+
+  def add_client(rows, protocol, client_id, count):
     """Adds all images of a client"""
     for i in range(1,count+1):
       if verbose>1: print("  Adding file '%s' to protocol '%s'" % (filename(client_id, i), protocol))
-      file_id = session.query(File).filter(File.name == filename(client_id, i)).first().id
-      session.add(People(protocol, file_id))
+      rows.append({'protocol': protocol, 'file_id': ids[filename(client_id, i)]})
 
   def parse_view1(session, filename, protocol):
     """Parses a file containing the people of view 1 of the LFW database"""
-    pfile = open(filename)
-    for line in pfile:
+    rows = []
+    with open(filename) as pfile:
+      lines = pfile.read().splitlines()
+    for line in lines:
       llist = line.split()
       if len(llist) == 2: # one person and the number of images
-        add_client(session, protocol, llist[0], int(llist[1]))
+        add_client(rows, protocol, llist[0], int(llist[1]))
+    insert_rows(session, People, rows)
 
   def parse_view2(session, filename):
     """Parses the file containing the people of view 2 of the LFW database"""
+    rows = []
     fold_id = 0
-    pfile = open(filename)
-    for line in pfile:
+    with open(filename) as pfile:
+      lines = pfile.read().splitlines()
+    for line in lines:
       llist = line.split()
       if len(llist) == 1: # the number of persons in the list
         protocol = "fold"+str(fold_id)
         fold_id += 1
       elif len(llist) == 2: # one person and the number of images
-        add_client(session, protocol, llist[0], int(llist[1]))
-        add_client(session, "view2", llist[0], int(llist[1]))
+        add_client(rows, protocol, llist[0], int(llist[1]))
+        add_client(rows, "view2", llist[0], int(llist[1]))
+    insert_rows(session, People, rows)
 
   # Adds view1 people
   if verbose: print("Adding people from 'peopleDevTrain.txt' ...")
@@ -106,63 +138,79 @@ def add_people(session, basedir, verbose):
 def add_pairs(session, basedir, verbose):
   """Adds the pairs for all protocols of the LFW database"""
 
-  def add_mpair(session, protocol, file_id1, file_id2):
-    """Add a matched pair to the LFW database."""
-    session.add(Pair(protocol, file_id1, file_id2, True))
-
-  def add_upair(session, protocol, file_id1, file_id2):
-    """Add an unmatched pair to the LFW database."""
-    session.add(Pair(protocol, file_id1, file_id2, False))
-
-  def parse_file(session, list_filename, protocol):
-    """Parses a file containing pairs and adds them to the LFW database"""
-    pfile = open(list_filename)
-    for line in pfile:
-      llist = line.split()
-      if len(llist) == 3: # Matched pair
-        file_id1 = session.query(File).filter(File.name == filename(llist[0], int(llist[1]))).first().id
-        file_id2 = session.query(File).filter(File.name == filename(llist[0], int(llist[2]))).first().id
+  ids = file_ids(session)
+
+  def parse_file(list_filename, protocol):
+    """Parses a file containing pairs and returns the rows to be added to the LFW database"""
+    rows = []
+    with open(list_filename) as pfile:
+      lines = pfile.read().splitlines()
+    for line in lines:
+      parts = line.split()
+      if len(parts) == 3: # Matched pair
+        client_id = parts[0]
+        file_id1 = ids["%s_%04d" % (client_id, int(parts[1]))]
+        file_id2 = ids["%s_%04d" % (client_id, int(parts[2]))]
         if verbose>1: print("  Adding matching pair ('%s', '%s')" % (file_id1, file_id2))
-        add_mpair(session, protocol, file_id1, file_id2)
+        rows.append({'protocol': protocol, 'enroll_file_id': file_id1, 'probe_file_id': file_id2, 'is_match': True})
 
-      elif len(llist) == 4: # Unmatched pair
-        file_id1 = session.query(File).filter(File.name == filename(llist[0], int(llist[1]))).first().id
-        file_id2 = session.query(File).filter(File.name == filename(llist[2], int(llist[3]))).first().id
+      elif len(parts) == 4: # Unmatched pair
+        file_id1 = ids["%s_%04d" % (parts[0], int(parts[1]))]
+        file_id2 = ids["%s_%04d" % (parts[2], int(parts[3]))]
         if verbose>1: print("  Adding unmatching pair ('%s', '%s')" % (file_id1, file_id2))
-        add_upair(session, protocol, file_id1, file_id2)
+        rows.append({'protocol': protocol, 'enroll_file_id': file_id1, 'probe_file_id': file_id2, 'is_match': False})
+
+    return rows
 
-  # flush session so that we get file ids
-  session.flush()
   # Adds view1 pairs
   if verbose: print("Adding pairs from 'pairsDevTrain.txt' ...")
-  parse_file(session, os.path.join(basedir, 'view1', 'pairsDevTrain.txt'), 'train')
+  insert_rows(session, Pair, parse_file(os.path.join(basedir, 'view1', 'pairsDevTrain.txt'), 'train'))
   if verbose: print("Adding pairs from 'pairsDevTest.txt' ...")
-  parse_file(session, os.path.join(basedir, 'view1', 'pairsDevTest.txt'), 'test')
+  insert_rows(session, Pair, parse_file(os.path.join(basedir, 'view1', 'pairsDevTest.txt'), 'test'))
 
   # Adds view2 pairs
   for fold in range(1,11):
     if verbose: print(F"Adding pairs from 'pairs_fold{fold}.txt' ...")
-    parse_file(session, os.path.join(basedir, 'view2', F'pairs_fold{fold}.txt'), F'fold{fold}')
-    parse_file(session, os.path.join(basedir, 'view2', F'pairs_fold{fold}.txt'), 'view2')
+    rows = parse_file(os.path.join(basedir, 'view2', F'pairs_fold{fold}.txt'), F'fold{fold}')
+    # the pairs of all folds are also part of the 'view2' protocol
+    insert_rows(session, Pair, rows + [dict(row, protocol='view2') for row in rows])
 
 
-def add_annotations(session, annotation_directory, annotation_extension, annotation_type, verbose):
+def read_annotation_file(annotation_file):
+  """Returns the content of the given annotation file, or None if it does not exist."""
+  if not os.path.exists(annotation_file):
+    return None
+  with open(annotation_file) as f:
+    return f.read()
+
+
+def add_annotations(session, annotation_directory, annotation_extension, annotation_type, verbose, chunk_size=1000, max_workers=16):
   """Adds annotations of the given type from the given source directory."""
-  session.flush()
+  from concurrent.futures import ThreadPoolExecutor
+
+  assert annotation_type in Annotation.annotation_type_choices
   # get all files
-  files = session.query(File)
+  files = session.query(File.id, File.path).all()
+  annotation_files = [os.path.join(annotation_directory, path + annotation_extension) for _, path in files]
   if verbose: print("Adding annotations of type '%s' from directory '%s'" % (annotation_type, annotation_directory))
-  for file in files:
-    # read annotations
-    annotation_file = file.make_path(annotation_directory, annotation_extension)
-    if not os.path.exists(annotation_file):
-      if verbose: print("WARNING: Skipping non-existing annotation file '%s'" % annotation_file)
-      continue
 
-    if verbose>1: print("  Adding annotation file '%s'" % annotation_file)
-    annotation_file_content = open(annotation_file).read()
-    # add annotations to the session
-    session.add(Annotation(file.id, annotation_type, annotation_file_content))
+  rows = []
+  # read annotation files in parallel, but write to the database from this thread only
+  with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    contents = executor.map(read_annotation_file, annotation_files)
+    for (file_id, _), annotation_file, content in zip(files, annotation_files, contents):
+      if content is None:
+        if verbose: print("WARNING: Skipping non-existing annotation file '%s'" % annotation_file)
+        continue
+
+      if verbose>1: print("  Adding annotation file '%s'" % annotation_file)
+      rows.append({'file_id': file_id, 'annotation_type': annotation_type, 'annotations': content})
+      # add annotations in chunks
+      if len(rows) == chunk_size:
+        insert_rows(session, Annotation, rows)
+        rows = []
+
+  insert_rows(session, Annotation, rows)
 
 
 def create_tables(args):
@@ -171,11 +219,30 @@ def create_tables(args):
   from bob.db.base.utils import create_engine_try_nolock
 
   engine = create_engine_try_nolock(args.type, args.files[0], echo=(args.verbose > 2))
+  if args.type == 'sqlite':
+    set_sqlite_pragmas(engine)
   Client.metadata.create_all(engine)
   File.metadata.create_all(engine)
   People.metadata.create_all(engine)
   Pair.metadata.create_all(engine)
   Annotation.metadata.create_all(engine)
+  engine.dispose()
+
+def add_indexes(args):
+  """Adds the indexes that are missing in an existing database"""
+
+  from sqlalchemy import inspect
+  from bob.db.base.utils import create_engine_try_nolock
+
+  engine = create_engine_try_nolock(args.type, args.files[0], echo=(args.verbose > 2))
+  inspector = inspect(engine)
+  for table in Base.metadata.sorted_tables:
+    existing = set(index['name'] for index in inspector.get_indexes(table.name))
+    for index in table.indexes:
+      if index.name not in existing:
+        if args.verbose: print("Adding index '%s' to table '%s' ..." % (index.name, table.name))
+        index.create(engine)
+  engine.dispose()
 
 # Driver API
 # ==========
@@ -187,6 +254,10 @@ def create(args):
 
   dbfile = args.files[0]
 
+  if args.add_indexes:
+    add_indexes(args)
+    return
+
   if args.recreate:
     if args.verbose and os.path.exists(dbfile):
       print('unlinking %s...' % dbfile)
@@ -196,8 +267,12 @@ def create(args):
     os.makedirs(os.path.dirname(dbfile))
 
   # the real work...
+  # all data is written inside the single transaction of the session,
+  # which is committed only once at the very end
   create_tables(args)
   s = session_try_nolock(args.type, args.files[0], echo=(args.verbose > 2))
+  if args.type == 'sqlite':
+    set_sqlite_pragmas(s.get_bind(), SQLITE_BUILD_PRAGMAS)
   add_files(s, args.basedir, args.verbose)
   add_people(s, args.basedir, args.verbose)
   add_pairs(s, args.basedir, args.verbose)
@@ -215,6 +290,7 @@ def add_command(subparsers):
   parser = subparsers.add_parser('create', help=create.__doc__)
 
   parser.add_argument('-R', '--recreate', action='store_true', help='If set, I\'ll first erase the current database')
+  parser.add_argument('-X', '--add-indexes', action='store_true', help='If set, I\'ll only add missing indexes to the current database')
   parser.add_argument('-v', '--verbose', action='count', help='Do SQL operations in a verbose way?')
   parser.add_argument('-D', '--basedir', metavar='DIR', default='/idiap/resource/database/lfw', help='Change the relative path to the directory containing the images of the LFW database.')
   parser.add_argument('-F', '--funneled-annotation-dir', default='/idiap/group/biometric/annotations/lfw/funneled/lfw_funneled', help="Set the directory, where the funneled annotations for LFW images can be found")
@@ -71,23 +71,38 @@ def dumppairs(args):
 
   return 0
 
+def existing_files(directory, extension):
+  """Returns the paths of the files in the client directories of the given directory that end with the given extension, relative to that directory"""
+
+  existing = set()
+  # unreadable directories are skipped by os.walk
+  for root, dirs, files in os.walk(directory, followlinks=True):
+    if root == directory:
+      # only descend into the client directories
+      continue
+    dirs[:] = []
+    client = os.path.basename(root)
+    existing.update(os.path.join(client, f) for f in files if f.endswith(extension or ''))
+  return existing
+
 def checkfiles(args):
   """Checks lists of files based on your criteria"""
 
   from .query import Database
   db = Database()
 
+  # collect the available files in a single directory walk
+  existing = existing_files(args.directory or os.curdir, args.extension)
+
   # go through all files, check if they are available on the filesystem
   good = {}
   bad = {}
-  for protocol in db.m_valid_protocols:
-    r = db.objects(protocol=protocol)
-
-    for f in r:
-      if os.path.exists(f.make_path(args.directory, args.extension)):
-        good[f.id] = f
-      else:
-        bad[f.id] = f
+  r = db.objects()
+  for f in r:
+    if f.make_path('', args.extension) in existing:
+      good[f.id] = f
+    else:
+      bad[f.id] = f
 
   # report
   output = sys.stdout
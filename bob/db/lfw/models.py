@@ -21,7 +21,7 @@
 """
 
 import sqlalchemy
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, or_, and_, not_
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Index, or_, and_, not_
 from bob.db.base.sqlalchemy_migration import Enum, relationship
 from sqlalchemy.orm import backref
 from sqlalchemy.ext.declarative import declarative_base
@@ -106,13 +106,14 @@ class Annotation(Base):
 
 
 def filename(client_id, shot_id):
-  return client_id + "_" + "0"*(4-len(str(shot_id))) + str(shot_id)
+  return "%s_%04d" % (client_id, int(shot_id))
 
 class File(Base, bob.db.base.File):
   """Information about the files of the LFW database."""
   __tablename__ = 'file'
+  __table_args__ = (Index('ix_file_client', 'client_id'),)
 
-  # Unique key identifier for the file; here we use strings
+  # Unique key identifier for the file; here we use integers
   id = Column(Integer, primary_key=True)
   # Unique name identifier for the file
   name = Column(String(100), unique=True)
@@ -124,9 +125,9 @@ class File(Base, bob.db.base.File):
   shot_id = Column(Integer)
 
   # a back-reference from file to client
-  client = relationship("Client", backref=backref("files", order_by=id))
+  client = relationship("Client", backref="files")
   # many-to-one relationship between annotations and files
-  annotations = relationship("Annotation", backref=backref("file", order_by=id, uselist=False))
+  annotations = relationship("Annotation", backref=backref("file", uselist=False))
 
   def __init__(self, client_id, shot_id):
     # call base class constructor
@@ -142,10 +143,15 @@ class File(Base, bob.db.base.File):
 class People(Base):
   """Information about the people (as given in the people.txt file) of the LFW database."""
   __tablename__ = 'people'
+  __table_args__ = (Index('ix_people_protocol_file', 'protocol', 'file_id'),)
 
   id = Column(Integer, primary_key=True)
-  protocol = Column(Enum('train', 'test', 'fold1', 'fold2', 'fold3', 'fold4', 'fold5', 'fold6', 'fold7', 'fold8', 'fold9', 'fold10', 'view2'))
-  file_id = Column(String(100), ForeignKey('file.id'))
+  # one of 'train', 'test', 'fold1', ..., 'fold10', 'view2'; a plain string without
+  # CHECK constraint, as long as the longest protocol name
+  protocol = Column(String(6))
+  # databases created before store the file ids as strings; SQLite still compares
+  # them as integers to file.id and to bound ids, but read values might be strings
+  file_id = Column(Integer, ForeignKey('file.id'))
 
   def __init__(self, protocol, file_id):
     self.protocol = protocol
@@ -158,14 +164,18 @@ class People(Base):
 class Pair(Base):
   """Information of the pairs (as given in the pairs.txt files) of the LFW database."""
   __tablename__ = 'pair'
+  __table_args__ = (Index('ix_pair_protocol_match', 'protocol', 'is_match'),
+                    Index('ix_pair_protocol_enroll', 'protocol', 'enroll_file_id'),
+                    Index('ix_pair_protocol_probe', 'protocol', 'probe_file_id'))
 
   id = Column(Integer, primary_key=True)
-  # train and test for view1, the folds for view2
-  protocol = Column(Enum('train', 'test', 'fold1', 'fold2', 'fold3', 'fold4', 'fold5', 'fold6', 'fold7', 'fold8', 'fold9', 'fold10', 'view2'))
-  enroll_file_id = Column(String(100), ForeignKey('file.id'))
-  probe_file_id = Column(String(100), ForeignKey('file.id'))
-  enroll_file = relationship("File", backref=backref("enroll_files", order_by=id), primaryjoin="Pair.enroll_file_id==File.id")
-  probe_file = relationship("File", backref=backref("probe_files", order_by=id), primaryjoin="Pair.probe_file_id==File.id")
+  # train and test for view1, the folds for view2 (see People.protocol)
+  protocol = Column(String(6))
+  # as for People.file_id, the file ids of older databases might be read as strings
+  enroll_file_id = Column(Integer, ForeignKey('file.id'))
+  probe_file_id = Column(Integer, ForeignKey('file.id'))
+  enroll_file = relationship("File", backref="enroll_files", primaryjoin="Pair.enroll_file_id==File.id")
+  probe_file = relationship("File", backref="probe_files", primaryjoin="Pair.probe_file_id==File.id")
   is_match = Column(Boolean)
 
   def __init__(self, protocol, enroll_file_id, probe_file_id, is_match):
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# vim: set fileencoding=utf-8 :
+# Copyright (C) 2026 Idiap Research Institute, Martigny, Switzerland
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""SQLite settings for building and querying the LFW database.
+"""
+
+# SQLite settings used while writing the database
+SQLITE_PRAGMAS = (
+  'PRAGMA synchronous=NORMAL',
+  'PRAGMA temp_store=MEMORY',
+  'PRAGMA cache_size=-65536',
+  'PRAGMA busy_timeout=30000',
+)
+
+# SQLite settings used while filling the database; nobody else accesses the
+# database file during that time, so the journal is kept in memory only and
+# is never stored in the file (the database is opened without locking anyway)
+SQLITE_BUILD_PRAGMAS = (
+  'PRAGMA journal_mode=MEMORY',
+  'PRAGMA synchronous=OFF',
+  'PRAGMA temp_store=MEMORY',
+  'PRAGMA cache_size=-65536',
+)
+
+# SQLite settings for the read-only query connections
+SQLITE_READ_PRAGMAS = (
+  'PRAGMA query_only=1',
+  'PRAGMA cache_size=-40000',
+  'PRAGMA temp_store=MEMORY',
+  'PRAGMA mmap_size=268435456',
+  'PRAGMA synchronous=OFF',
+)
+
+def set_sqlite_pragmas(engine, pragmas=SQLITE_PRAGMAS):
+  """Issues the given pragmas on every new connection of the given engine."""
+  from sqlalchemy import event
+
+  @event.listens_for(engine, 'connect')
+  def set_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in pragmas:
+      cursor.execute(pragma)
+    cursor.close()
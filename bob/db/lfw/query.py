@@ -24,13 +24,62 @@ LFW database.
 import six
 from bob.db.base import utils
 from .models import *
-from sqlalchemy.orm import aliased
+from .pragmas import SQLITE_READ_PRAGMAS, set_sqlite_pragmas
+from sqlalchemy import bindparam
+from sqlalchemy.orm import aliased, contains_eager, selectinload
+from sqlalchemy.ext import baked
 from .driver import Interface
 
 import bob.db.base
 
 SQLITE_FILE = Interface().files()[0]
 
+# caches the compiled SQL of the queries that are issued once per file;
+# SQLAlchemy 1.3 has no compiled cache for plain queries
+bakery = baked.bakery()
+
+# the enroll and probe files of the pairs; created once, so that the
+# statements using them are identical for all calls
+ENROLL_FILE = aliased(File)
+PROBE_FILE = aliased(File)
+
+def _join_pair_files(query):
+  # joins the files of the pairs of the given query, and fills the
+  # enroll_file and probe_file relationships from the joined files
+  return query.\
+      join((ENROLL_FILE, ENROLL_FILE.id == Pair.enroll_file_id)).\
+      join((PROBE_FILE, PROBE_FILE.id == Pair.probe_file_id)).\
+      options(contains_eager(Pair.enroll_file, alias=ENROLL_FILE),
+              contains_eager(Pair.probe_file, alias=PROBE_FILE))
+
+# the number of folds in the training set of each sub-world
+SUBWORLD_COUNTS = {'onefolds': 1, 'twofolds': 2, 'threefolds': 3,
+                   'fourfolds': 4, 'fivefolds': 5, 'sixfolds': 6, 'sevenfolds': 7}
+
+
+def _eval(fold):
+  return int(fold[4:])
+
+def _dev(eval):
+  # take the two parts of the training set (the ones before the eval set)
+  # for dev
+  return ((eval + 7) % 10 + 1, (eval + 8) % 10 + 1)
+
+# the development folds for each fold
+DEV_FOR = dict(("fold%d" % eval, tuple("fold%d" % f for f in _dev(eval))) for eval in range(1, 11))
+
+# the training folds for each fold and sub-world;
+# the training sets for each fold are composed of all folds
+# except the given one and the previous
+WORLD_FOR = dict((("fold%d" % eval, subworld), tuple("fold%d" % ((eval + i) % 10 + 1) for i in range(count)))
+                 for eval in range(1, 11) for subworld, count in SUBWORLD_COUNTS.items())
+
+def _model_id_tuple(model_ids):
+  # a single model id might be given instead of a list of model ids
+  if isinstance(model_ids, six.string_types):
+    return (model_ids,)
+  return tuple(model_ids) if model_ids else ()
+
 
 class Database(bob.db.base.SQLiteDatabase):
   """The dataset class opens and maintains a connection opened to the Database.
@@ -44,13 +93,16 @@ class Database(bob.db.base.SQLiteDatabase):
     super(Database, self).__init__(SQLITE_FILE, File,
                                    original_directory, original_extension)
 
+    if self.is_valid():
+      set_sqlite_pragmas(self.m_session.get_bind(), SQLITE_READ_PRAGMAS)
+
     self.m_valid_protocols = ('view1', 'view2', 'fold1', 'fold2', 'fold3',
                               'fold4', 'fold5', 'fold6', 'fold7', 'fold8', 'fold9', 'fold10')
     self.m_valid_groups = ('world', 'dev', 'eval')
     self.m_valid_purposes = ('enroll', 'probe')
     self.m_valid_classes = ('matched', 'client', 'unmatched', 'impostor')
-    self.m_subworld_counts = {'onefolds': 1, 'twofolds': 2, 'threefolds': 3,
-                              'fourfolds': 4, 'fivefolds': 5, 'sixfolds': 6, 'sevenfolds': 7}
+    self.m_subworld_counts = SUBWORLD_COUNTS
+    self.m_valid_subworlds = tuple(SUBWORLD_COUNTS)
     self.m_valid_types = ('restricted', 'unrestricted')
 
     self.m_valid_annotation_types = ('idiap', 'funneled')
@@ -60,27 +112,30 @@ class Database(bob.db.base.SQLiteDatabase):
     else:
       self.m_annotation_type = None
 
+  def __setstate__(self, state):
+    # the unpickled database opens a new session, which needs the settings again
+    super(Database, self).__setstate__(state)
+    if self.is_valid():
+      set_sqlite_pragmas(self.m_session.get_bind(), SQLITE_READ_PRAGMAS)
+
   def __eval__(self, fold):
-    return int(fold[4:])
+    return _eval(fold)
 
   def __dev__(self, eval):
-    # take the two parts of the training set (the ones before the eval set)
-    # for dev
-    return ((eval + 7) % 10 + 1, (eval + 8) % 10 + 1)
+    return _dev(eval)
 
   def __dev_for__(self, fold):
-    return ["fold%d" % f for f in self.__dev__(self.__eval__(fold))]
+    return DEV_FOR[fold]
 
   def __world_for__(self, fold, subworld):
-    # the training sets for each fold are composed of all folds
-    # except the given one and the previous
-    eval = self.__eval__(fold)
-    dev = self.__dev__(eval)
-    world_count = self.m_subworld_counts[subworld]
-    world = []
-    for i in range(world_count):
-      world.append((eval + i) % 10 + 1)
-    return ["fold%d" % f for f in world]
+    return WORLD_FOR[(fold, subworld)]
+
+  def __used_in_pairs__(self, query, criterion):
+    # joins the files of the given query with the pairs that use them as enroll
+    # or as probe file; the union of two joins can use the indexes on both
+    # columns, which a join on an OR condition cannot
+    return query.join((Pair, File.id == Pair.enroll_file_id)).filter(criterion).union(
+        query.join((Pair, File.id == Pair.probe_file_id)).filter(criterion))
 
   def protocol_names(self):
     """Returns the names of the valid protocols."""
@@ -109,7 +164,7 @@ class Database(bob.db.base.SQLiteDatabase):
     s = set([a.annotation_type for a in self.query(Annotation)])
     return [str(t) for t in s]
 
-  def clients(self, protocol=None, groups=None, subworld='sevenfolds', world_type='unrestricted'):
+  def clients(self, protocol=None, groups=None, subworld='sevenfolds', world_type='unrestricted', load_files=False):
     """Returns a list of Client objects for the specific query by the user.
 
     Keyword Parameters:
@@ -133,81 +188,101 @@ class Database(bob.db.base.SQLiteDatabase):
       all training people are returned.
       Ignored for group 'dev' and 'eval'.
 
+    load_files
+      If set, the files of all returned clients are loaded with one additional query,
+      instead of one query per client when accessing ``client.files``.
+
     Returns: A list containing all Client objects which have the desired properties.
     """
+    # collect the clients of all queries
+    retval = []
+    for query in self.__client_queries__(protocol, groups, subworld, world_type):
+      if load_files:
+        query = query.options(selectinload(Client.files))
+      retval.extend(query.all())
+
+    return self.uniquify(retval)
+
+  def iter_clients(self, protocol=None, groups=None, subworld='sevenfolds', world_type='unrestricted', chunk_size=1000):
+    """Iterates over the Client objects for the specific query by the user.
+    The parameters are identical to the ones of the clients() function.
+    In contrast to clients(), the clients are streamed from the database in chunks of
+    the given size, and they are not sorted.
+
+    Yields: The Client objects which have the desired properties.
+    """
+    seen = set()
+    for query in self.__client_queries__(protocol, groups, subworld, world_type):
+      for client in query.yield_per(chunk_size):
+        if client.id not in seen:
+          seen.add(client.id)
+          yield client
+
+  def count_clients(self, protocol=None, groups=None, subworld='sevenfolds', world_type='unrestricted'):
+    """Returns the number of clients for the specific query by the user, without creating Client objects.
+    The parameters are identical to the ones of the clients() function.
+    """
+    ids = set()
+    for query in self.__client_queries__(protocol, groups, subworld, world_type):
+      ids.update(id for (id,) in query.with_entities(Client.id))
+    return len(ids)
+
+  def __client_queries__(self, protocol, groups, subworld, world_type):
+    # returns the queries for the clients() function
     protocols = self.check_parameters_for_validity(
         protocol, 'protocol', self.m_valid_protocols)
     groups = self.check_parameters_for_validity(
         groups, 'group', self.m_valid_groups)
-    if subworld != None:
+    if subworld is not None:
       subworld = self.check_parameter_for_validity(
-          subworld, 'sub-world', list(self.m_subworld_counts.keys()))
+          subworld, 'sub-world', self.m_valid_subworlds)
     world_type = self.check_parameter_for_validity(
         world_type, 'training type', self.m_valid_types)
 
-    queries = []
-
-    # List of the clients
+    # collect the protocols of the people and of the pairs that define the clients
+    people_protocols = set()
+    pair_protocols = set()
     for protocol in protocols:
       if protocol == 'view1':
         if 'world' in groups:
           if world_type == 'restricted':
-            queries.append(
-                self.query(Client).join(File).join((Pair, or_(File.id == Pair.enroll_file_id, File.id == Pair.probe_file_id))).
-                filter(Pair.protocol == 'train').
-                order_by(Client.id))
+            pair_protocols.add('train')
           else:
-            queries.append(
-                self.query(Client).join(File).join(People).
-                filter(People.protocol == 'train').
-                order_by(Client.id))
+            people_protocols.add('train')
         if 'dev' in groups:
-          queries.append(
-              self.query(Client).join(File).join(People).
-              filter(People.protocol == 'test').
-              order_by(Client.id))
+          people_protocols.add('test')
       elif protocol == 'view2':
         if 'dev' in groups:
-          queries.append(
-              self.query(Client).join(File).join(People).
-              filter(People.protocol == protocol).
-              order_by(Client.id))
+          people_protocols.add(protocol)
       else:
         if 'world' in groups:
           # select training set for the given fold
           trainset = self.__world_for__(protocol, subworld)
           if world_type == 'restricted':
-            queries.append(
-                self.query(Client).join(File).join((Pair, or_(File.id == Pair.enroll_file_id, File.id == Pair.probe_file_id))).
-                filter(Pair.protocol.in_(trainset)).
-                order_by(Client.id))
+            pair_protocols.update(trainset)
           else:
-            queries.append(
-                self.query(Client).join(File).join(People).
-                filter(People.protocol.in_(trainset)).
-                order_by(Client.id))
+            people_protocols.update(trainset)
         if 'dev' in groups:
           # select development set for the given fold
-          devset = self.__dev_for__(protocol)
-          queries.append(
-              self.query(Client).join(File).join(People).
-              filter(People.protocol.in_(devset)).
-              order_by(Client.id))
+          people_protocols.update(self.__dev_for__(protocol))
         if 'eval' in groups:
-          queries.append(
-              self.query(Client).join(File).join(People).
-              filter(People.protocol == protocol).
-              order_by(Client.id))
-
-    # all queries are made; now collect the clients
-    retval = []
-    for query in queries:
-      for client in query:
-        retval.append(client)
+          people_protocols.add(protocol)
 
-    return self.uniquify(retval)
-
-  def models(self, protocol=None, groups=None):
+    # query the clients of all groups at once
+    queries = []
+    if people_protocols:
+      queries.append(
+          self.query(Client).join(File).join(People).
+          filter(People.protocol.in_(sorted(people_protocols))).
+          distinct())
+    if pair_protocols:
+      queries.append(
+          self.__used_in_pairs__(self.query(Client).join(File),
+                                 Pair.protocol.in_(sorted(pair_protocols))))
+
+    return queries
+
+  def models(self, protocol=None, groups=None, only_ids=False):
     """Returns a list of File objects (there are multiple models per client) for the specific query by the user.
     For the 'dev' and 'eval' groups,  the first element of each pair is extracted.
 
@@ -220,7 +295,10 @@ class Database(bob.db.base.SQLiteDatabase):
       The groups to which the clients belong; one or several of: ('dev', 'eval')
       The 'eval' group does not exist for protocol 'view1'.
 
-    Returns: A list containing all File objects which have the desired properties.
+    only_ids
+      If set, only the ids of the files are queried and returned, without creating File objects.
+
+    Returns: A list containing all File objects (or their ids) which have the desired properties.
     """
 
     protocols = self.check_parameters_for_validity(
@@ -260,7 +338,10 @@ class Database(bob.db.base.SQLiteDatabase):
     # all queries are made; now collect the files
     retval = []
     for query in queries:
-      retval.extend([file for file in query])
+      if only_ids:
+        retval.extend(id for (id,) in query.with_entities(File.id))
+      else:
+        retval.extend(query.all())
 
     return self.uniquify(retval)
 
@@ -279,7 +360,7 @@ class Database(bob.db.base.SQLiteDatabase):
 
     Returns: A list containing all model ids which have the desired properties.
     """
-    return [file.id for file in self.models(protocol, groups)]
+    return self.models(protocol, groups, only_ids=True)
 
   def get_client_id_from_file_id(self, file_id, **kwargs):
     """Returns the client_id (real client id) attached to the given file_id
@@ -293,11 +374,11 @@ class Database(bob.db.base.SQLiteDatabase):
     """
     self.assert_validity()
 
-    q = self.query(File).\
-        filter(File.id == file_id)
-
-    assert q.count() == 1
-    return q.first().client_id
+    query = bakery(lambda session: session.query(File.client_id))
+    query += lambda q: q.filter(File.id == bindparam('file_id'))
+    # the file id is the primary key, so no separate check for uniqueness is required;
+    # one() still raises an exception if the file does not exist
+    return query(self.m_session).params(file_id=file_id).one()[0]
 
   def get_client_id_from_model_id(self, model_id, **kwargs):
     """Returns the client_id (real client id) attached to the given model id
@@ -349,7 +430,39 @@ class Database(bob.db.base.SQLiteDatabase):
 
     Returns: A list of File objects considering all the filtering criteria.
     """
+    model_ids = _model_id_tuple(model_ids)
+    queries = self.__object_queries__(protocol, model_ids, groups, purposes, subworld, world_type)
+    if not queries:
+      return []
+
+    if len(model_ids) > 1:
+      # the model ids are bound in each of the queries; executing them one by one
+      # keeps the number of parameters of a statement at the number of model ids
+      retval = []
+      for query in queries:
+        retval.extend(query.all())
+      return self.uniquify(retval)
+
+    # execute all queries as a single UNION statement
+    return self.uniquify(queries[0].union(*queries[1:]).all())
 
+  def iter_objects(self, protocol=None, model_ids=None, groups=None, purposes=None, subworld='sevenfolds', world_type='unrestricted', chunk_size=1000):
+    """Iterates over the File objects for the specific query by the user.
+    The parameters are identical to the ones of the objects() function.
+    In contrast to objects(), the files are streamed from the database in chunks of
+    the given size, and they are not sorted.
+
+    Yields: The File objects considering all the filtering criteria.
+    """
+    seen = set()
+    for query in self.__object_queries__(protocol, model_ids, groups, purposes, subworld, world_type):
+      for file in query.yield_per(chunk_size):
+        if file.id not in seen:
+          seen.add(file.id)
+          yield file
+
+  def __object_queries__(self, protocol, model_ids, groups, purposes, subworld, world_type):
+    # returns the queries for the objects() function
     protocols = self.check_parameters_for_validity(
         protocol, "protocol", self.m_valid_protocols)
     groups = self.check_parameters_for_validity(
@@ -359,16 +472,14 @@ class Database(bob.db.base.SQLiteDatabase):
     world_type = self.check_parameter_for_validity(
         world_type, 'training type', self.m_valid_types)
 
-    if subworld != None:
+    if subworld is not None:
       subworld = self.check_parameter_for_validity(
-          subworld, 'sub-world', list(self.m_subworld_counts.keys()))
+          subworld, 'sub-world', self.m_valid_subworlds)
 
-    if(isinstance(model_ids, six.string_types)):
-      model_ids = (model_ids,)
+    model_ids = _model_id_tuple(model_ids)
 
     queries = []
     probe_queries = []
-    file_alias = aliased(File)
 
     for protocol in protocols:
       if protocol == 'view1':
@@ -376,8 +487,7 @@ class Database(bob.db.base.SQLiteDatabase):
           # training files of view1
           if world_type == 'restricted':
             queries.append(
-                self.query(File).join((Pair, or_(File.id == Pair.enroll_file_id, File.id == Pair.probe_file_id))).
-                filter(Pair.protocol == 'train'))
+                self.__used_in_pairs__(self.query(File), Pair.protocol == 'train'))
           else:
             queries.append(
                 self.query(File).join(People).
@@ -392,7 +502,6 @@ class Database(bob.db.base.SQLiteDatabase):
             probe_queries.append(
                 self.query(File).
                 join((Pair, File.id == Pair.probe_file_id)).
-                join((file_alias, Pair.enroll_file_id == file_alias.id)).
                 filter(Pair.protocol == 'test'))
 
       elif protocol == 'view2':
@@ -407,7 +516,6 @@ class Database(bob.db.base.SQLiteDatabase):
             probe_queries.append(
                 self.query(File).
                 join((Pair, File.id == Pair.probe_file_id)).
-                join((file_alias, file_alias.id == Pair.enroll_file_id)).
                 filter(Pair.protocol == protocol))
 
       else:
@@ -417,8 +525,7 @@ class Database(bob.db.base.SQLiteDatabase):
           trainset = self.__world_for__(protocol, subworld)
           if world_type == 'restricted':
             queries.append(
-                self.query(File).join((Pair, or_(File.id == Pair.enroll_file_id, File.id == Pair.probe_file_id))).
-                filter(Pair.protocol.in_(trainset)))
+                self.__used_in_pairs__(self.query(File), Pair.protocol.in_(trainset)))
           else:
             queries.append(
                 self.query(File).join(People).
@@ -435,7 +542,6 @@ class Database(bob.db.base.SQLiteDatabase):
             probe_queries.append(
                 self.query(File).
                 join((Pair, File.id == Pair.probe_file_id)).
-                join((file_alias, file_alias.id == Pair.enroll_file_id)).
                 filter(Pair.protocol.in_(devset)))
 
         if 'eval' in groups:
@@ -448,24 +554,79 @@ class Database(bob.db.base.SQLiteDatabase):
             probe_queries.append(
                 self.query(File).
                 join((Pair, File.id == Pair.probe_file_id)).
-                join((file_alias, file_alias.id == Pair.enroll_file_id)).
                 filter(Pair.protocol == protocol))
 
-    retval = []
-    for query in queries:
-      if model_ids and len(model_ids):
-        query = query.filter(File.id.in_(model_ids))
+    if len(model_ids) == 1:
+      # a single model is selected by equality
+      queries = [query.filter(File.id == model_ids[0]) for query in queries]
+      probe_queries = [query.filter(Pair.enroll_file_id == model_ids[0]) for query in probe_queries]
+    elif model_ids:
+      # several models are bound as one expanding parameter, so that the statement
+      # does not depend on the number of models
+      queries = [query.filter(File.id.in_(bindparam('model_ids', expanding=True))).params(model_ids=list(model_ids))
+                 for query in queries]
+      probe_queries = [query.filter(Pair.enroll_file_id.in_(bindparam('model_ids', expanding=True))).params(model_ids=list(model_ids))
+                       for query in probe_queries]
+
+    return queries + probe_queries
+
+  def objects_by_model(self, model_ids, protocol=None, groups=None, chunk_size=500):
+    """Returns the probe File objects of several models at once.
+    This is equivalent to calling objects(protocol, groups=groups, purposes='probe', model_ids=(model_id,))
+    for each of the given models, but requires only one query per chunk of models.
 
-      retval.extend([file for file in query])
+    Keyword Parameters:
 
-    for query in probe_queries:
-      if model_ids and len(model_ids):
-        query = query.filter(file_alias.id.in_(model_ids))
+    model_ids
+      The ids of the models (as returned by model_ids()) for which the probe files should be returned
 
-      for probe in query:
-        retval.append(probe)
+    protocol
+      The protocol to consider ('view1', 'fold1', ..., 'fold10'), or None
 
-    return self.uniquify(retval)
+    groups
+      The groups to which the models belong ('dev', 'eval')
+
+    chunk_size
+      The maximum number of model ids that are bound to a single query
+
+    Returns: A dictionary from each of the given model ids to the list of its probe File objects.
+    """
+
+    protocols = self.check_parameters_for_validity(
+        protocol, "protocol", self.m_valid_protocols)
+    groups = self.check_parameters_for_validity(
+        groups, "group", ('dev', 'eval'))
+
+    # collect the protocols of the pairs of the given groups
+    pair_protocols = set()
+    for protocol in protocols:
+      if protocol == 'view1':
+        if 'dev' in groups:
+          pair_protocols.add('test')
+      elif protocol == 'view2':
+        if 'dev' in groups:
+          pair_protocols.add(protocol)
+      else:
+        if 'dev' in groups:
+          pair_protocols.update(self.__dev_for__(protocol))
+        if 'eval' in groups:
+          pair_protocols.add(protocol)
+
+    retval = dict((model_id, []) for model_id in model_ids)
+    if pair_protocols and retval:
+      query = self.query(Pair.enroll_file_id, File).select_from(File).\
+          join((Pair, File.id == Pair.probe_file_id)).\
+          filter(Pair.protocol.in_(sorted(pair_protocols))).\
+          filter(Pair.enroll_file_id.in_(bindparam('model_ids', expanding=True)))
+      # the model ids are bound in chunks, as there might be more of them
+      # than SQLite accepts as parameters of a single statement
+      ids = list(retval)
+      for first in range(0, len(ids), chunk_size):
+        for model_id, probe in query.params(model_ids=ids[first:first+chunk_size]):
+          # databases created with string file id columns return the ids as strings
+          retval[int(model_id)].append(probe)
+
+    return dict((model_id, self.uniquify(probes)) for model_id, probes in retval.items())
 
   def pairs(self, protocol=None, groups=None, classes=None, subworld='sevenfolds'):
     """Queries a list of Pair's of files.
@@ -489,44 +650,37 @@ class Database(bob.db.base.SQLiteDatabase):
     Returns: A list of Pair's considering all the filtering criteria.
     """
 
-    def default_query():
-      return self.query(Pair).\
-          join((File1, File1.id == Pair.enroll_file_id)).\
-          join((File2, File2.id == Pair.probe_file_id))
-
     protocol = self.check_parameter_for_validity(
         protocol, "protocol", self.m_valid_protocols)
     groups = self.check_parameters_for_validity(
         groups, "group", self.m_valid_groups)
     classes = self.check_parameters_for_validity(
         classes, "class", self.m_valid_classes)
-    if subworld != None:
+    if subworld is not None:
       subworld = self.check_parameter_for_validity(
-          subworld, 'sub-world', list(self.m_subworld_counts.keys()))
+          subworld, 'sub-world', self.m_valid_subworlds)
 
     queries = []
-    File1 = aliased(File)
-    File2 = aliased(File)
 
     if protocol == 'view1':
       if 'world' in groups:
-        queries.append(default_query().filter(Pair.protocol == 'train'))
+        queries.append(_join_pair_files(self.query(Pair)).filter(Pair.protocol == 'train'))
       if 'dev' in groups:
-        queries.append(default_query().filter(Pair.protocol == 'test'))
+        queries.append(_join_pair_files(self.query(Pair)).filter(Pair.protocol == 'test'))
 
     elif protocol == 'view2':
       if 'dev' in groups:
-        queries.append(default_query().filter(Pair.protocol == protocol))
+        queries.append(_join_pair_files(self.query(Pair)).filter(Pair.protocol == protocol))
 
     else:
       if 'world' in groups:
         trainset = self.__world_for__(protocol, subworld)
-        queries.append(default_query().filter(Pair.protocol.in_(trainset)))
+        queries.append(_join_pair_files(self.query(Pair)).filter(Pair.protocol.in_(trainset)))
       if 'dev' in groups:
         devset = self.__dev_for__(protocol)
-        queries.append(default_query().filter(Pair.protocol.in_(devset)))
+        queries.append(_join_pair_files(self.query(Pair)).filter(Pair.protocol.in_(devset)))
       if 'eval' in groups:
-        queries.append(default_query().filter(Pair.protocol == protocol))
+        queries.append(_join_pair_files(self.query(Pair)).filter(Pair.protocol == protocol))
 
     retval = []
     for query in queries:
@@ -535,8 +689,8 @@ class Database(bob.db.base.SQLiteDatabase):
       if 'unmatched' not in classes and 'impostor' not in classes:
         query = query.filter(Pair.is_match == True)
 
-      for pair in query:
-        retval.append(pair)
+      # keep the order of the pair lists, independent of the index used by the query
+      retval.extend(query.order_by(Pair.id).all())
 
     return retval
 
@@ -559,10 +713,12 @@ class Database(bob.db.base.SQLiteDatabase):
     annotation_type = self.check_parameters_for_validity(
         annotation_type, "annotation type", self.m_valid_annotation_types)
 
-    query = self.query(Annotation).filter(Annotation.annotation_type.in_(
-        annotation_type)).join(File).filter(File.id == file.id)
-    assert query.count() == 1
-    annotation = query.first()
+    query = bakery(lambda session: session.query(Annotation))
+    query += lambda q: q.filter(Annotation.annotation_type.in_(bindparam('annotation_types', expanding=True))).\
+        filter(Annotation.file_id == bindparam('file_id'))
+    annotations = query(self.m_session).params(annotation_types=list(annotation_type), file_id=file.id).all()
+    assert len(annotations) == 1
+    annotation = annotations[0]
 
     # return the annotations as returned by the call function of the
     # Annotation object
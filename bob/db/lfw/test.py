@@ -41,6 +41,26 @@ def db_available(test):
   return wrapper
 
 
+class count_statements(object):
+  """Context manager counting the SQL statements that are executed for the given database"""
+
+  def __init__(self, db):
+    self.engine = db.m_session.get_bind()
+    self.count = 0
+
+  def _count(self, *args, **kwargs):
+    self.count += 1
+
+  def __enter__(self):
+    from sqlalchemy import event
+    event.listen(self.engine, 'before_cursor_execute', self._count)
+    return self
+
+  def __exit__(self, *args):
+    from sqlalchemy import event
+    event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
 # expected numbers of clients
 # restricted; unrestricted; dev; eval
 expected_clients = {
@@ -129,11 +149,18 @@ def test_clients():
     assert len(db.clients(protocol=p, groups='world', world_type='restricted')) == l[1]
     assert len(db.clients(protocol=p, groups='dev')) == l[2]
     assert len(db.clients(protocol=p, groups='eval')) == l[3]
+    # the streamed and counted clients are the same as the listed ones
+    for kwargs in (dict(groups='world', world_type='unrestricted'), dict(groups='world', world_type='restricted'), dict(groups='dev'), dict(groups='eval')):
+      clients = db.clients(protocol=p, **kwargs)
+      assert sorted(db.iter_clients(protocol=p, chunk_size=100, **kwargs)) == clients
+      assert db.count_clients(protocol=p, **kwargs) == len(clients)
 
   # check the number of models per protocol
   for p,l in expected_models.items():
     assert len(db.models(protocol=p, groups='dev')) == l[0]
     assert len(db.models(protocol=p, groups='eval')) == l[1]
+    # the model ids are queried without creating File objects
+    assert db.model_ids(protocol=p, groups='dev') == [model.id for model in db.models(protocol=p, groups='dev')]
 
 
 @db_available
@@ -144,6 +171,7 @@ def test_objects():
   # first, count all objects
   assert len(db.objects()) == 13233
   assert len(db.objects(world_type='restricted')) == 9056
+  assert len(list(db.iter_objects())) == 13233
 
   # check that the files() function returns the same number of elements as the models() function does
   for p,l in expected_models.items():
@@ -163,14 +191,24 @@ def test_objects():
   for p,l in expected_unrestricted_training_images.items():
     assert len(db.objects(protocol=p, groups='world', world_type='unrestricted', subworld='sevenfolds')) == l
 
+  # many model ids can be selected at once, with more ids than queries
+  model_ids = db.model_ids()
+  assert db.objects(groups=('dev', 'eval'), purposes='enroll', model_ids=model_ids) == db.models()
+  model_ids = db.model_ids(protocol='view2', groups='dev')
+  assert db.objects(protocol='view2', groups='dev', purposes='probe', model_ids=model_ids) == db.objects(protocol='view2', groups='dev', purposes='probe')
+
   # check that the probe files sum up to 1000 (view1) or 600 (view2)
   for p in expected_models.keys():
     expected_probe_count = len(db.pairs(protocol=p, groups='dev'))
     # count the probes for each model
-    current_probe_count = 0
-    models = db.models(protocol=p, groups='dev')
-    for model_id in [model.id for model in models]:
-      current_probe_count += len(db.objects(protocol=p, groups='dev', purposes='probe', model_ids = (model_id,)))
+    model_ids = db.model_ids(protocol=p, groups='dev')
+    probes = db.objects_by_model(model_ids, protocol=p, groups='dev')
+    current_probe_count = sum(len(probes[model_id]) for model_id in model_ids)
+    # the probes of the models are the same as the ones of the objects() function
+    sample = random.sample(model_ids, min(len(model_ids), 20))
+    for model_id in sample:
+      assert probes[model_id] == db.objects(protocol=p, groups='dev', purposes='probe', model_ids = (model_id,))
+    assert db.objects(protocol=p, groups='dev', purposes='probe', model_ids = sample) == db.uniquify([f for model_id in sample for f in probes[model_id]])
     # assure that the number of probes is equal to the number of pairs
     assert current_probe_count == expected_probe_count
 
@@ -222,6 +260,39 @@ def test_annotations():
         assert len(annotations['reye']) == 2
 
 
+@db_available
+def test_query_counts():
+  # Tests that related objects are not loaded with one query per object
+  db = bob.db.lfw.Database()
+
+  # the files of the pairs are loaded with the pairs
+  with count_statements(db) as counter:
+    pairs = db.pairs(protocol='fold1', groups='dev')
+    assert all(p.enroll_file.path and p.probe_file.path for p in pairs)
+  assert counter.count == 1
+
+  # the files of the clients are loaded in batches of 500 clients, not per client
+  with count_statements(db) as counter:
+    clients = db.clients(protocol='fold1', groups='dev', load_files=True)
+    assert all(f.path for c in clients for f in c.files)
+  assert counter.count == 1 + (len(clients) + 499) // 500
+
+  # the probes of the models are queried in chunks, not per model
+  model_ids = db.model_ids(protocol='fold1', groups='dev')
+  with count_statements(db) as counter:
+    db.objects_by_model(model_ids, protocol='fold1', groups='dev', chunk_size=500)
+  assert counter.count == (len(model_ids) + 499) // 500
+
+
+@db_available
+def test_pickle():
+  # Tests that the SQLite settings are restored for unpickled databases
+  import pickle
+  from sqlalchemy import text
+  db = pickle.loads(pickle.dumps(bob.db.lfw.Database()))
+  assert db.m_session.execute(text('PRAGMA cache_size')).scalar() == -40000
+
+
 @db_available
 def test_driver_api():
   from bob.db.base.script.dbmanage import main